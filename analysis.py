@@ -1,14 +1,20 @@
+import re
 import altair as alt
+import connectorx as cx
+import numpy as np
 import pandas as pd
 import streamlit as st
 from streamlit_folium import st_folium
 import folium
-from folium.plugins import MarkerCluster, HeatMap
-from database.database_consumer import connect_server
+from folium.plugins import FastMarkerCluster, HeatMap
+from numba import njit, types
+from database.async_pool import fetch_all
+from database.db_utils import connect_server, get_database_url
+from modules.cache_utils import load_cached_result, parquet_cache, store_cached_result
+from modules.tuned_queries import TUNED_QUERY_SETTINGS
 
 from modules.queries import (
     TRAFFIC_HEATMAP_BASE,
-    KPIS_BASE,
     ROUTE_PERFORMANCE_BASE,
     PEAK_NONPEAK_BASE,
     ENV_IMPACT_BASE,
@@ -19,28 +25,241 @@ from modules.queries import (
     VEHICLE_COUNT_BASE,
 )
 
+SPEED_BIN_WIDTH = 2
+SPEED_BIN_COUNT = 60
+SPEED_CHUNK_SIZE = 50_000
+
+# The speeds are typed read-only because pandas copy-on-write hands out read-only
+# arrays; writable arrays match the signature too.
+BIN_SPEEDS_SIGNATURE = types.void(
+    types.Array(types.float64, 1, "A", readonly=True),
+    types.int32[:],
+    types.float64,
+    types.int64[:, :],
+)
+
+BUS_MARKER_CALLBACK = """
+function (row) {
+    var icon = L.AwesomeMarkers.icon({icon: "bus", prefix: "fa", markerColor: "blue"});
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+    marker.bindPopup(row[2]);
+    return marker;
+}
+"""
+
+
+@st.cache_resource
+def get_engine():
+    """
+    Returns the SQLAlchemy engine shared by every session and rerun of the app.
+
+    :return: Pooled SQLAlchemy engine or None if it could not be created.
+    """
+    return connect_server()
+
+
+def fetch_table(query):
+    """
+    Executes the given SQL query through connectorx and returns a pyarrow Table.
+
+    The result is built column by column in Arrow without Python row tuples or
+    pandas dtype inference, so callers that do not need a DataFrame can read the
+    columns directly.
 
-@st.cache_data
+    :param query: SQL query string without parameters.
+    :return: pyarrow Table with query results.
+    """
+    print(f"Executing Query:\n{query}")
+    return cx.read_sql(
+        get_database_url(), query.strip().rstrip(";"), return_type="arrow"
+    )
+
+
+@parquet_cache()
 def fetch_data(query, params=None):
     """
     Executes the given SQL query with optional parameters and returns a pandas DataFrame.
+    Results are cached on disk as Parquet for CACHE_TTL seconds.
+
+    Queries without parameters are read as an Arrow table by fetch_table, which is
+    converted to pandas while its buffers are released. connectorx cannot bind
+    parameters, so parameterized queries fall back to pandas.read_sql on the
+    pooled engine.
 
     :param query: SQL query string.
     :param params: Optional tuple of parameters for parameterized queries.
     :return: pandas DataFrame with query results or None if connection fails.
     """
-    engine = connect_server()
+    if params is None:
+        return fetch_table(query).to_pandas(self_destruct=True)
+
+    print(f"Executing Query:\n{query}")
+    engine = get_engine()
     if engine is None:
         return None
-    print(f"Executing Query:\n{query}")
+    print(f"With Parameters: {params}")
+    return pd.read_sql(query, engine, params=params)
+
+
+def tuned_settings_key(name, params):
+    """
+    Returns the TUNED_QUERY_SETTINGS key of a section query.
+
+    The unfiltered and the route-filtered variant of a section have different
+    plans, so they are tuned and looked up separately.
+
+    :param name: Name of the section query.
+    :param params: The query parameters; None for the unfiltered variant.
+    :return: The section name, suffixed with ":route" for the filtered variant.
+    """
+    return name if params is None else f"{name}:route"
+
+
+def prefetch_data(queries):
+    """
+    Fetches the results of several queries at once, keyed by name.
+
+    Results still in the fetch_data cache are reused. The remaining queries are
+    run concurrently over the shared asyncpg pool, so the wait is bounded by the
+    slowest query rather than their sum, and their results are added to the cache.
+    Queries with an entry in TUNED_QUERY_SETTINGS, keyed by tuned_settings_key,
+    run with those session settings.
+
+    :param queries: Dictionary mapping a name to a (query, params) tuple.
+    :return: Dictionary mapping each name to its pandas DataFrame.
+    """
+    namespace = fetch_data.cache_namespace
+    results = {}
+    missing = {}
+    for name, (query, params) in queries.items():
+        df = load_cached_result(namespace, query, params)
+        if df is None:
+            missing[name] = (query, params)
+        else:
+            results[name] = df
+
+    if missing:
+        frames = fetch_all(
+            list(missing.values()),
+            [
+                TUNED_QUERY_SETTINGS.get(tuned_settings_key(name, params))
+                for name, (query, params) in missing.items()
+            ],
+        )
+        for (name, (query, params)), df in zip(missing.items(), frames):
+            store_cached_result(namespace, query, params, df)
+            results[name] = df
+    return results
+
+
+def fetch_chunks(query, params=None, chunksize=SPEED_CHUNK_SIZE):
+    """
+    Streams the result of the given SQL query as a sequence of pandas DataFrames.
+
+    The rows are read through a server-side cursor, so only one chunk is held in
+    memory at a time.
+
+    :param query: SQL query string.
+    :param params: Optional tuple of parameters for parameterized queries.
+    :param chunksize: Number of rows per yielded DataFrame.
+    :return: Generator of pandas DataFrames; empty if the connection fails.
+    """
+    engine = get_engine()
+    if engine is None:
+        return
+    print(f"Streaming Query:\n{query}")
     if params:
         print(f"With Parameters: {params}")
-    return pd.read_sql(query, engine, params=params)
+    with engine.connect().execution_options(stream_results=True) as connection:
+        yield from pd.read_sql(query, connection, params=params, chunksize=chunksize)
+
+
+@njit(BIN_SPEEDS_SIGNATURE, cache=True)
+def bin_speeds(speeds, route_codes, bin_width, counts):
+    """
+    Adds each speed to its route's row of a 2-D histogram in place.
+
+    Speeds beyond the last bin are counted in it. The loop is compiled with Numba
+    and runs serially, since concurrent increments of the same cell would race.
+    The signature is fixed, so the kernel is compiled (or loaded from the on-disk
+    cache) at import instead of on the first dashboard run. Read-only speed arrays,
+    as returned by pandas with copy-on-write, are accepted as well as writable ones.
+
+    :param speeds: float64 array of speeds in km/h.
+    :param route_codes: int32 array with the histogram row of each speed.
+    :param bin_width: Width of a bin in km/h.
+    :param counts: int64 array of shape (routes, bins) to add to.
+    """
+    last_bin = counts.shape[1] - 1
+    for i in range(speeds.shape[0]):
+        b = int(speeds[i] / bin_width)
+        if b > last_bin:
+            b = last_bin
+        elif b < 0:
+            b = 0
+        counts[route_codes[i], b] += 1
+
+
+@parquet_cache()
+def fetch_speed_histogram(query, params=None):
+    """
+    Bins the speeds returned by the given SQL query into a histogram per route.
+
+    The query must return route_id and speed columns. Rows are streamed in chunks;
+    the route_ids of each chunk are factorized into histogram rows and the speeds
+    are added to fixed-width bins of SPEED_BIN_WIDTH km/h by bin_speeds. Rows
+    without a route_id are skipped.
+
+    :param query: SQL query string.
+    :param params: Optional tuple of parameters for parameterized queries.
+    :return: pandas DataFrame with route_id, speed (bin center) and count columns.
+    """
+    route_rows = {}
+    counts = np.zeros((0, SPEED_BIN_COUNT), np.int64)
+    for chunk in fetch_chunks(query, params):
+        codes, uniques = pd.factorize(chunk["route_id"])
+        valid = codes >= 0
+        rows = np.array(
+            [route_rows.setdefault(route_id, len(route_rows)) for route_id in uniques],
+            dtype=np.int32,
+        )
+        if len(route_rows) > counts.shape[0]:
+            grown = np.zeros((len(route_rows), SPEED_BIN_COUNT), np.int64)
+            grown[: counts.shape[0]] = counts
+            counts = grown
+        bin_speeds(
+            chunk["speed"].to_numpy(np.float64)[valid],
+            rows[codes[valid]],
+            float(SPEED_BIN_WIDTH),
+            counts,
+        )
+
+    route_index, bin_index = np.nonzero(counts)
+    return pd.DataFrame(
+        {
+            "route_id": np.array(list(route_rows), dtype=object)[route_index],
+            "speed": (bin_index + 0.5) * SPEED_BIN_WIDTH,
+            "count": counts[route_index, bin_index],
+        }
+    )
+
+
+def route_params(selected_route):
+    """
+    Returns the query parameters matching build_route_query for the selected route.
+
+    :param selected_route: The route_id to filter by or "All" for no filtering.
+    :return: A one-element tuple with the route_id, or None for "All".
+    """
+    return (selected_route,) if selected_route != "All" else None
 
 
 def build_route_query(base_query, selected_route, column="route_id"):
     """
-    Appends a WHERE clause to the base query if a specific route is selected.
+    Appends a route filter to the base query if a specific route is selected.
+
+    The filter is added with WHERE, or with AND when the base query already has a
+    WHERE clause, so the database filters the rows before grouping them.
 
     :param base_query: The base SQL query string.
     :param selected_route: The route_id to filter by or "All" for no filtering.
@@ -48,62 +267,77 @@ def build_route_query(base_query, selected_route, column="route_id"):
     :return: Modified SQL query string.
     """
     if selected_route != "All":
-        base_query += f" WHERE {column} = %s"
+        has_where = re.search(r"\bWHERE\b", base_query, re.IGNORECASE)
+        base_query += f" {'AND' if has_where else 'WHERE'} {column} = %s"
     return base_query
 
 
-def display_traffic_density_heatmap(selected_route):
+def traffic_density_heatmap_query(selected_route):
     """
-    Displays a heatmap of traffic density based on latitude and longitude.
+    Builds the SQL query and parameters for the traffic density heatmap.
 
     :param selected_route: The route_id to filter by or "All" for no filtering.
+    :return: Tuple of the query string and its parameters (or None).
     """
     query = TRAFFIC_HEATMAP_BASE
     query = build_route_query(query, selected_route)
-    query += " GROUP BY latitude, longitude ORDER BY traffic_count DESC;"
+    query += " GROUP BY lat_bin, lng_bin ORDER BY traffic_count DESC LIMIT 5000;"
 
-    df = fetch_data(
-        query, params=(selected_route,) if selected_route != "All" else None
-    )
+    return query, route_params(selected_route)
+
+
+def display_traffic_density_heatmap(selected_route, df=None):
+    """
+    Displays a heatmap of traffic density based on latitude and longitude.
+    The positions are binned into cells of 0.001 degrees by the query, so only
+    one weighted point per cell is sent to the map. The points are stacked from
+    float32 columns instead of going through the mixed-dtype DataFrame values.
+
+    :param selected_route: The route_id to filter by or "All" for no filtering.
+    :param df: Optional pre-fetched query result; fetched when omitted.
+    """
+    if df is None:
+        df = fetch_data(*traffic_density_heatmap_query(selected_route))
 
     if df.empty:
         st.write("No data available.")
         return
 
-    map_center = [df["latitude"].mean(), df["longitude"].mean()]
+    lat = df["lat_bin"].to_numpy(np.float32)
+    lng = df["lng_bin"].to_numpy(np.float32)
+    weight = df["traffic_count"].to_numpy(np.float32)
+
+    map_center = [float(lat.mean()), float(lng.mean())]
     traffic_map = folium.Map(location=map_center, zoom_start=12)
 
-    heat_data = [
-        [row["latitude"], row["longitude"], row["traffic_count"]]
-        for _, row in df.iterrows()
-    ]
+    heat_data = np.column_stack([lat, lng, weight]).tolist()
 
-    HeatMap(heat_data).add_to(traffic_map)
+    HeatMap(heat_data, radius=8).add_to(traffic_map)
 
     st_folium(traffic_map, width=800, height=600)
 
 
-def display_kpis(selected_route):
+def display_kpis(selected_route, df=None):
     """
     Displays Key Performance Indicators (KPIs) such as average speed, highest traffic count, and busiest route.
 
+    The KPIs are taken from the five busiest routes of the route performance
+    result, so the same query serves both sections.
+
     :param selected_route: The route_id to filter by or "All" for no filtering.
+    :param df: Optional pre-fetched route performance result; fetched when omitted.
     """
-    query = KPIS_BASE
-    query = build_route_query(query, selected_route)
-    query += " GROUP BY route_id ORDER BY traffic_count DESC LIMIT 5;"
-
-    df = fetch_data(
-        query, params=(selected_route,) if selected_route != "All" else None
-    )
+    if df is None:
+        df = fetch_data(*route_performance_query(selected_route))
 
     if df.empty:
         st.write("No data available.")
         return
 
-    avg_speed = df["avg_speed"].mean()
-    highest_traffic = df["traffic_count"].max()
-    busiest_route = df.loc[df["traffic_count"].idxmax()]["route_id"]
+    top_routes = df.head(5)
+    avg_speed = top_routes["avg_speed"].mean()
+    highest_traffic = top_routes["traffic_count"].max()
+    busiest_route = top_routes["route_id"].iloc[0]
 
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -115,19 +349,29 @@ def display_kpis(selected_route):
     st.write("---")
 
 
-def analyze_route_performance(selected_route):
+def route_performance_query(selected_route):
     """
-    Analyzes and visualizes route performance based on average speed and traffic count.
+    Builds the SQL query and parameters for the route performance analysis.
 
     :param selected_route: The route_id to filter by or "All" for no filtering.
+    :return: Tuple of the query string and its parameters (or None).
     """
     query = ROUTE_PERFORMANCE_BASE
     query = build_route_query(query, selected_route)
     query += " GROUP BY route_id ORDER BY traffic_count DESC;"
 
-    df = fetch_data(
-        query, params=(selected_route,) if selected_route != "All" else None
-    )
+    return query, route_params(selected_route)
+
+
+def analyze_route_performance(selected_route, df=None):
+    """
+    Analyzes and visualizes route performance based on average speed and traffic count.
+
+    :param selected_route: The route_id to filter by or "All" for no filtering.
+    :param df: Optional pre-fetched query result; fetched when omitted.
+    """
+    if df is None:
+        df = fetch_data(*route_performance_query(selected_route))
 
     if df.empty:
         st.write("No data available for route performance.")
@@ -158,19 +402,29 @@ def analyze_route_performance(selected_route):
     st.altair_chart(chart, use_container_width=True)
 
 
-def analyze_peak_vs_nonpeak(selected_route):
+def peak_vs_nonpeak_query(selected_route):
     """
-    Analyzes and visualizes traffic volume and average speed during peak and non-peak hours.
+    Builds the SQL query and parameters for the peak vs non-peak analysis.
 
     :param selected_route: The route_id to filter by or "All" for no filtering.
+    :return: Tuple of the query string and its parameters (or None).
     """
     query = PEAK_NONPEAK_BASE
     query = build_route_query(query, selected_route)
     query += " GROUP BY hour ORDER BY hour;"
 
-    df = fetch_data(
-        query, params=(selected_route,) if selected_route != "All" else None
-    )
+    return query, route_params(selected_route)
+
+
+def analyze_peak_vs_nonpeak(selected_route, df=None):
+    """
+    Analyzes and visualizes traffic volume and average speed during peak and non-peak hours.
+
+    :param selected_route: The route_id to filter by or "All" for no filtering.
+    :param df: Optional pre-fetched query result; fetched when omitted.
+    """
+    if df is None:
+        df = fetch_data(*peak_vs_nonpeak_query(selected_route))
 
     if df.empty:
         st.write("No data available for peak vs non-peak analysis.")
@@ -211,19 +465,29 @@ def analyze_peak_vs_nonpeak(selected_route):
     st.altair_chart(chart + chart2, use_container_width=True)
 
 
-def analyze_environmental_impact(selected_route):
+def environmental_impact_query(selected_route):
     """
-    Estimates the environmental impact by calculating CO2 emissions based on traffic conditions.
+    Builds the SQL query and parameters for the environmental impact analysis.
 
     :param selected_route: The route_id to filter by or "All" for no filtering.
+    :return: Tuple of the query string and its parameters (or None).
     """
     query = ENV_IMPACT_BASE
     query = build_route_query(query, selected_route)
-    query += " GROUP BY route_id ORDER BY traffic_count DESC;"
+    query += " GROUP BY route_id ORDER BY estimated_emissions DESC NULLS LAST LIMIT 15;"
 
-    df = fetch_data(
-        query, params=(selected_route,) if selected_route != "All" else None
-    )
+    return query, route_params(selected_route)
+
+
+def analyze_environmental_impact(selected_route, df=None):
+    """
+    Estimates the environmental impact by calculating CO2 emissions based on traffic conditions.
+
+    :param selected_route: The route_id to filter by or "All" for no filtering.
+    :param df: Optional pre-fetched query result; fetched when omitted.
+    """
+    if df is None:
+        df = fetch_data(*environmental_impact_query(selected_route))
 
     if df.empty:
         st.write("No data available for environmental impact analysis.")
@@ -236,10 +500,8 @@ def analyze_environmental_impact(selected_route):
     """
     )
 
-     df["estimated_emissions"] = df["traffic_count"] * (1 / df["avg_speed"])
-
     chart = (
-        alt.Chart(df.head(15))
+        alt.Chart(df)
         .mark_bar()
         .encode(
             x="route_id:N",
@@ -253,21 +515,32 @@ def analyze_environmental_impact(selected_route):
     st.altair_chart(chart, use_container_width=True)
 
 
-def analyze_correlation(selected_route):
+def correlation_query(selected_route):
     """
-    Examines the correlation between speed and traffic count.
+    Builds the SQL query and parameters for the correlation analysis.
 
     :param selected_route: The route_id to filter by or "All" for no filtering.
+    :return: Tuple of the query string and its parameters (or None).
     """
     query = CORRELATION_BASE
     query = build_route_query(query, selected_route)
-    query += " GROUP BY speed ORDER BY traffic_count DESC;"
+    query += " GROUP BY speed) AS speed_counts;"
 
-    df = fetch_data(
-        query, params=(selected_route,) if selected_route != "All" else None
-    )
+    return query, route_params(selected_route)
 
-    if df.empty:
+
+def analyze_correlation(selected_route, df=None):
+    """
+    Examines the correlation between speed and traffic count.
+    The correlation coefficient is computed by the query with CORR.
+
+    :param selected_route: The route_id to filter by or "All" for no filtering.
+    :param df: Optional pre-fetched query result; fetched when omitted.
+    """
+    if df is None:
+        df = fetch_data(*correlation_query(selected_route))
+
+    if df.empty or df["rho"].isna().all():
         st.write("No data available for correlation analysis.")
         return
 
@@ -278,10 +551,17 @@ def analyze_correlation(selected_route):
     """
     )
 
-     corr = df.corr()
+    columns = ["speed", "traffic_count"]
+    rho = float(df["rho"].iloc[0])
+    corr = np.array([[1.0, rho], [rho, 1.0]])
 
-    corr_reset = corr.reset_index().melt(id_vars="index")
-    corr_reset.columns = ["variable", "index", "value"]
+    corr_reset = pd.DataFrame(
+        {
+            "variable": columns * 2,
+            "index": np.repeat(columns, 2),
+            "value": corr.ravel(),
+        }
+    )
 
     heatmap = (
         alt.Chart(corr_reset)
@@ -303,20 +583,33 @@ def analyze_correlation(selected_route):
     st.altair_chart(heatmap, use_container_width=True)
 
 
-def analyze_route_optimization(selected_route):
+def route_optimization_query(selected_route):
     """
-    Suggests ways to optimize route speeds based on average speed and delay.
+    Builds the SQL query and parameters for the route optimization analysis.
 
     :param selected_route: The route_id to filter by or "All" for no filtering.
+    :return: Tuple of the query string and its parameters (or None).
     """
     query = ROUTE_OPTIMIZATION_BASE
     query = build_route_query(query, selected_route)
-    query += " GROUP BY route_id ORDER BY avg_speed DESC;"
-
-    df = fetch_data(
-        query, params=(selected_route,) if selected_route != "All" else None
+    query += (
+        " GROUP BY route_id) AS routes) AS ranked"
+        " WHERE speed_rank <= 15 ORDER BY speed_rank;"
     )
 
+    return query, route_params(selected_route)
+
+
+def analyze_route_optimization(selected_route, df=None):
+    """
+    Suggests ways to optimize route speeds based on average speed and delay.
+
+    :param selected_route: The route_id to filter by or "All" for no filtering.
+    :param df: Optional pre-fetched query result; fetched when omitted.
+    """
+    if df is None:
+        df = fetch_data(*route_optimization_query(selected_route))
+
     if df.empty:
         st.write("No data available for route optimization analysis.")
         return
@@ -328,11 +621,8 @@ def analyze_route_optimization(selected_route):
     """
     )
 
-
-    df["suggested_speed"] = df["avg_speed"] + (10 - df["avg_speed"]) / 2
-
     chart = (
-        alt.Chart(df.head(15))
+        alt.Chart(df)
         .mark_bar()
         .encode(
             x="route_id:N",
@@ -346,13 +636,13 @@ def analyze_route_optimization(selected_route):
     st.altair_chart(chart, use_container_width=True)
 
 
-def display_map(selected_route):
+def map_query(selected_route):
     """
-    Displays a map with markers for vehicle locations.
+    Builds the SQL query and parameters for the vehicle location map.
 
     :param selected_route: The route_id to filter by or "All" for no filtering.
+    :return: Tuple of the query string and its parameters (or None).
     """
-
     query = """
     SELECT vehicle_id, route_id, latitude, longitude
     FROM vehicle_data
@@ -361,9 +651,18 @@ def display_map(selected_route):
     query = build_route_query(query, selected_route)
     query += " LIMIT 100;"
 
-    df = fetch_data(
-        query, params=(selected_route,) if selected_route != "All" else None
-    )
+    return query, route_params(selected_route)
+
+
+def display_map(selected_route, df=None):
+    """
+    Displays a map with markers for vehicle locations.
+
+    :param selected_route: The route_id to filter by or "All" for no filtering.
+    :param df: Optional pre-fetched query result; fetched when omitted.
+    """
+    if df is None:
+        df = fetch_data(*map_query(selected_route))
 
     if df.empty:
         st.write("No vehicle location data available.")
@@ -372,47 +671,47 @@ def display_map(selected_route):
     map_center = [df["latitude"].mean(), df["longitude"].mean()]
     bus_map = folium.Map(location=map_center, zoom_start=12)
 
-    marker_cluster = MarkerCluster().add_to(bus_map)
+    popups = (
+        "Vehicle ID: "
+        + df["vehicle_id"].astype(str)
+        + " | Route ID: "
+        + df["route_id"].astype(str)
+    )
+    data = df[["latitude", "longitude"]].assign(popup=popups).to_numpy().tolist()
 
-    for _, row in df.iterrows():
-        folium.Marker(
-            location=[row["latitude"], row["longitude"]],
-            popup=f"Vehicle ID: {row['vehicle_id']} | Route ID: {row['route_id']}",
-            icon=folium.Icon(color="blue", icon="bus", prefix="fa"),
-        ).add_to(marker_cluster)
+    FastMarkerCluster(data, callback=BUS_MARKER_CALLBACK).add_to(bus_map)
 
     st_folium(bus_map, width=800, height=600)
 
 
-def analyze_traffic_by_day_of_week(selected_route):
+def traffic_by_day_of_week_query(selected_route):
     """
-    Analyzes and visualizes traffic counts by day of the week.
+    Builds the SQL query and parameters for the traffic by day of week analysis.
 
     :param selected_route: The route_id to filter by or "All" for no filtering.
+    :return: Tuple of the query string and its parameters (or None).
     """
     query = TRAFFIC_BY_DAY_OF_WEEK_BASE
     query = build_route_query(query, selected_route)
-    query += " GROUP BY day_of_week ORDER BY day_of_week;"
+    query += " GROUP BY dow ORDER BY dow;"
+
+    return query, route_params(selected_route)
 
-    df = fetch_data(
-        query, params=(selected_route,) if selected_route != "All" else None
-    )
+
+def analyze_traffic_by_day_of_week(selected_route, df=None):
+    """
+    Analyzes and visualizes traffic counts by day of the week.
+
+    :param selected_route: The route_id to filter by or "All" for no filtering.
+    :param df: Optional pre-fetched query result; fetched when omitted.
+    """
+    if df is None:
+        df = fetch_data(*traffic_by_day_of_week_query(selected_route))
 
     if df.empty:
         st.write("No data available for traffic by day of the week.")
         return
 
-    day_mapping = {
-        0: "Sunday",
-        1: "Monday",
-        2: "Tuesday",
-        3: "Wednesday",
-        4: "Thursday",
-        5: "Friday",
-        6: "Saturday",
-    }
-    df["day_name"] = df["day_of_week"].map(day_mapping)
-
     st.write(
         """
     This analysis shows how traffic counts vary by day of the week. A bar chart visualizes traffic patterns
@@ -446,19 +745,29 @@ def analyze_traffic_by_day_of_week(selected_route):
     st.altair_chart(chart, use_container_width=True)
 
 
-def analyze_speed_distribution_by_route(selected_route):
+def speed_distribution_query(selected_route):
     """
-    Analyzes and visualizes the distribution of vehicle speeds for selected routes.
+    Builds the SQL query and parameters for the speed distribution analysis.
 
     :param selected_route: The route_id to filter by or "All" for no filtering.
+    :return: Tuple of the query string and its parameters (or None).
     """
     query = SPEED_DISTRIBUTION_BASE
     query = build_route_query(query, selected_route)
-    query += " ORDER BY speed DESC;"
+    query += ";"
 
-    df = fetch_data(
-        query, params=(selected_route,) if selected_route != "All" else None
-    )
+    return query, route_params(selected_route)
+
+
+def analyze_speed_distribution_by_route(selected_route, df=None):
+    """
+    Analyzes and visualizes the distribution of vehicle speeds for selected routes.
+
+    :param selected_route: The route_id to filter by or "All" for no filtering.
+    :param df: Optional pre-fetched query result; fetched when omitted.
+    """
+    if df is None:
+        df = fetch_speed_histogram(*speed_distribution_query(selected_route))
 
     if df.empty:
         st.write("No data available for speed distribution analysis.")
@@ -475,9 +784,9 @@ def analyze_speed_distribution_by_route(selected_route):
         .mark_bar()
         .encode(
             x="speed:Q",
-            y="count():Q",
+            y="count:Q",
             color="route_id:N",
-            tooltip=["speed", "count()"],
+            tooltip=["route_id", "speed", "count"],
         )
         .properties(title="Speed Distribution by Route")
     )
@@ -485,19 +794,29 @@ def analyze_speed_distribution_by_route(selected_route):
     st.altair_chart(chart, use_container_width=True)
 
 
-def analyze_vehicle_count_per_route(selected_route):
+def vehicle_count_query(selected_route):
     """
-    Analyzes and visualizes the total count of vehicles operating on each route.
+    Builds the SQL query and parameters for the vehicle count analysis.
 
     :param selected_route: The route_id to filter by or "All" for no filtering.
+    :return: Tuple of the query string and its parameters (or None).
     """
     query = VEHICLE_COUNT_BASE
     query = build_route_query(query, selected_route)
     query += " GROUP BY route_id ORDER BY vehicle_count DESC;"
 
-    df = fetch_data(
-        query, params=(selected_route,) if selected_route != "All" else None
-    )
+    return query, route_params(selected_route)
+
+
+def analyze_vehicle_count_per_route(selected_route, df=None):
+    """
+    Analyzes and visualizes the total count of vehicles operating on each route.
+
+    :param selected_route: The route_id to filter by or "All" for no filtering.
+    :param df: Optional pre-fetched query result; fetched when omitted.
+    """
+    if df is None:
+        df = fetch_data(*vehicle_count_query(selected_route))
 
     if df.empty:
         st.write("No data available for vehicle count analysis.")
@@ -522,3 +841,16 @@ def analyze_vehicle_count_per_route(selected_route):
     )
 
     st.altair_chart(chart, use_container_width=True)
+
+
+SECTION_QUERIES = {
+    "map": map_query,
+    "heatmap": traffic_density_heatmap_query,
+    "route_performance": route_performance_query,
+    "peak_vs_nonpeak": peak_vs_nonpeak_query,
+    "environmental_impact": environmental_impact_query,
+    "correlation": correlation_query,
+    "route_optimization": route_optimization_query,
+    "traffic_by_day_of_week": traffic_by_day_of_week_query,
+    "vehicle_count": vehicle_count_query,
+}
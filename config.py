@@ -1,3 +1,5 @@
+import os
+
 API_KEY = "Request an API Key for testing at the following link: https://opendata.bkk.hu/keys"
 
 KAFKA_BOOTSTRAP_SERVERS = "localhost:9092"
@@ -8,3 +10,9 @@ DB_USER = "postgres"
 DB_PASSWORD = "postgres"
 DB_HOST = "localhost"
 DB_PORT = "5432"
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "bkk")
+CACHE_TTL = 60
+
+# Exact COUNT(DISTINCT) instead of HyperLogLog estimates, e.g. for QA runs.
+EXACT_DISTINCT_COUNTS = False
@@ -1,12 +1,31 @@
+import os
+
+os.environ.setdefault("PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION", "upb")
+
 from config import API_KEY
 import requests
-import json
-from encoders.gtfs_realtime_pb2 import FeedMessage
+from requests.adapters import HTTPAdapter
+import orjson
+import numpy as np
+from encoders.gtfs_realtime_pb2 import FeedMessage, VehicleDescriptor
+from google.protobuf.internal import api_implementation
 from time import sleep
-from datetime import datetime, timezone
-from modules.kafka_utils import create_kafka_producer
+from modules.kafka_utils import flush_producer, get_producer
+
+KAFKA_BATCH_SIZE = 500
+KAFKA_PRODUCE_ATTEMPTS = 5
+
+# vehicle_data.wheelchair_accessible is a BOOLEAN; NO_VALUE and UNKNOWN map to NULL.
+WHEELCHAIR_ACCESSIBILITY = {
+    VehicleDescriptor.WHEELCHAIR_ACCESSIBLE: True,
+    VehicleDescriptor.WHEELCHAIR_INACCESSIBLE: False,
+}
 
-producer = create_kafka_producer()
+producer = get_producer()
+
+session = requests.Session()
+session.headers.update({"Accept-Encoding": "gzip"})
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=10))
 
 
 def fetch_data(API_KEY=API_KEY):
@@ -14,95 +33,192 @@ def fetch_data(API_KEY=API_KEY):
     Fetch GTFS vehicle position data from the BKK API.
 
     :param API_KEY: BKK API key string. Defaults to the one in config.py.
-    :return: A list of dictionaries with vehicle position information.
+    :return: A dictionary mapping each vehicle field to a list of values.
     """
     try:
-        vehicle_position_response = requests.get(
-            f"https://go.bkk.hu/api/query/v1/ws/gtfs-rt/full/VehiclePositions.pb?key={API_KEY}"
+        vehicle_position_response = session.get(
+            f"https://go.bkk.hu/api/query/v1/ws/gtfs-rt/full/VehiclePositions.pb?key={API_KEY}",
+            timeout=5,
         )
         vehicle_position_response.raise_for_status()
 
         feed = FeedMessage()
         feed.ParseFromString(vehicle_position_response.content)
 
-        vehicle_data = []
-
-        if feed.IsInitialized():
-            for entity in feed.entity:
-                if entity.HasField("vehicle"):
-                    vehicle = entity.vehicle
-                    vehicle_info = extract_vehicle_info(vehicle)
-                    if vehicle_info:
-                        vehicle_data.append(vehicle_info)
-
-        else:
+        if not feed.IsInitialized():
             print("Vehicle Position data is not fully initialized.")
+            return {}
 
-        return vehicle_data
+        return extract_vehicle_info(feed)
 
     except requests.exceptions.RequestException as e:
         print(f"Error while fetching data: {e}\n" + "-" * 30)
-        return []
+        return {}
 
 
-def extract_vehicle_info(vehicle):
+def extract_vehicle_info(feed):
     """
-    Extract relevant vehicle position data into a dictionary.
+    Extract relevant vehicle position data from a feed into column lists.
 
-    :param vehicle: The GTFS vehicle object.
-    :return: Dictionary with keys like trip_id, route_id, latitude, speed, etc.
+    The entities are walked once, packing the fields of each vehicle into a single
+    tuple, and the tuples are transposed into columns afterwards. The speed
+    conversion is then applied to the whole column at once. Timestamps are kept as
+    Unix epoch seconds and converted by the database on insert. The wheelchair
+    accessibility enum is mapped to True, False or None for the BOOLEAN column.
+
+    :param feed: The parsed GTFS FeedMessage.
+    :return: Dictionary mapping trip_id, route_id, latitude, speed, etc. to lists,
+             or an empty dictionary if the feed holds no usable vehicles.
     """
-    
-    if vehicle.trip.route_id == "9999":
-        return
-    
-    vehicle_info = {
-        "trip_id": vehicle.trip.trip_id,
-        "route_id": vehicle.trip.route_id,
-        "latitude": vehicle.position.latitude,
-        "longitude": vehicle.position.longitude,
-        "bearing": vehicle.position.bearing,
-        "speed": vehicle.position.speed * 3.6,
-        "current_stop_sequence": vehicle.current_stop_sequence,
-        "current_status": vehicle.current_status,
-        "timestamp": datetime.fromtimestamp(
-            vehicle.timestamp, tz=timezone.utc
-        ).strftime("%Y-%m-%d %H:%M:%S"),
-        "stop_id": vehicle.stop_id,
-        "vehicle_id": vehicle.vehicle.id,
-        "vehicle_label": vehicle.vehicle.label,
-        "license_plate": vehicle.vehicle.license_plate,
-        "wheelchair_accessible": vehicle.vehicle.wheelchair_accessible,
+    rows = []
+    append_row = rows.append
+    for entity in feed.entity:
+        if not entity.HasField("vehicle"):
+            continue
+        vehicle = entity.vehicle
+        trip = vehicle.trip
+        route_id = trip.route_id
+        if route_id == "9999":
+            continue
+        position = vehicle.position
+        descriptor = vehicle.vehicle
+        append_row(
+            (
+                trip.trip_id,
+                route_id,
+                position.latitude,
+                position.longitude,
+                position.bearing,
+                position.speed,
+                vehicle.current_stop_sequence,
+                vehicle.current_status,
+                vehicle.timestamp,
+                vehicle.stop_id,
+                descriptor.id,
+                descriptor.label,
+                descriptor.license_plate,
+                descriptor.wheelchair_accessible,
+            )
+        )
+
+    if not rows:
+        return {}
+
+    (
+        trip_ids,
+        route_ids,
+        latitudes,
+        longitudes,
+        bearings,
+        speeds,
+        stop_sequences,
+        statuses,
+        timestamps,
+        stop_ids,
+        vehicle_ids,
+        vehicle_labels,
+        license_plates,
+        wheelchair_flags,
+    ) = map(list, zip(*rows))
+
+    return {
+        "trip_id": trip_ids,
+        "route_id": route_ids,
+        "latitude": latitudes,
+        "longitude": longitudes,
+        "bearing": bearings,
+        "speed": (np.asarray(speeds, dtype=np.float64) * 3.6).tolist(),
+        "current_stop_sequence": stop_sequences,
+        "current_status": statuses,
+        "timestamp": timestamps,
+        "stop_id": stop_ids,
+        "vehicle_id": vehicle_ids,
+        "vehicle_label": vehicle_labels,
+        "license_plate": license_plates,
+        "wheelchair_accessible": [
+            WHEELCHAIR_ACCESSIBILITY.get(flag) for flag in wheelchair_flags
+        ],
     }
-    return vehicle_info
+
+
+def report_delivery(err, msg):
+    """
+    Logs a message that could not be delivered to Kafka.
+
+    Called from the producer's poll thread for every queued message.
+
+    :param err: KafkaError if delivery failed, otherwise None.
+    :param msg: The message the report is for.
+    """
+    if err is not None:
+        print(f"Failed to deliver a message to {msg.topic()}: {err}")
+
+
+def produce_batch(batch_json):
+    """
+    Queues a message on the producer, waiting for room while its queue is full.
+
+    :param batch_json: The serialized batch.
+    :return: True if the message was queued within KAFKA_PRODUCE_ATTEMPTS tries.
+    """
+    for _ in range(KAFKA_PRODUCE_ATTEMPTS):
+        try:
+            producer.produce(
+                "vehicle-data", value=batch_json, on_delivery=report_delivery
+            )
+            return True
+        except BufferError:
+            producer.poll(1.0)
+    return False
 
 
 def send_to_kafka(vehicle_data):
     """
     Send fetched vehicle data to Kafka.
 
-    :param vehicle_data: List of vehicle data dictionaries.
+    The columns are split into batches of KAFKA_BATCH_SIZE vehicles and each batch
+    is sent as a single message. Messages are only queued: librdkafka batches and
+    sends them in the background while the producer's poll thread serves the
+    delivery reports, logging failed deliveries through report_delivery.
+
+    :param vehicle_data: Dictionary mapping each vehicle field to a list of values.
     """
-    for vehicle in vehicle_data:
-        vehicle_json = json.dumps(vehicle)
+    vehicle_count = len(vehicle_data["vehicle_id"])
+    for start in range(0, vehicle_count, KAFKA_BATCH_SIZE):
+        batch = {
+            field: values[start : start + KAFKA_BATCH_SIZE]
+            for field, values in vehicle_data.items()
+        }
+        batch_json = orjson.dumps(batch)
         try:
-            producer.produce("vehicle-data", value=vehicle_json)
-            producer.flush()
-            print(f"Sent vehicle data to Kafka: {vehicle}")
+            if not produce_batch(batch_json):
+                print("Kafka producer queue is full; dropped a batch of vehicles.")
         except Exception as e:
             print(f"Error sending to Kafka: {e}")
 
+    print(f"Queued {vehicle_count} vehicle records for Kafka.")
+
 
 def main():
-    while True:
-        print("Fetching data from API...")
-        vehicle_data = fetch_data()
-        if vehicle_data:
-            print("Sending data to Kafka...")
-            send_to_kafka(vehicle_data)
-        else:
-            print("No data fetched.")
-        sleep(10)
+    if api_implementation.Type() != "upb":
+        print(
+            f"Using the {api_implementation.Type()} protobuf backend; "
+            "install protobuf with upb support for faster feed parsing."
+        )
+    try:
+        while True:
+            print("Fetching data from API...")
+            vehicle_data = fetch_data()
+            if vehicle_data:
+                print("Sending data to Kafka...")
+                send_to_kafka(vehicle_data)
+            else:
+                print("No data fetched.")
+            sleep(10)
+    finally:
+        remaining = flush_producer()
+        if remaining:
+            print(f"{remaining} message(s) were not delivered to Kafka.")
 
 
 if __name__ == "__main__":
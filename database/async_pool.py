@@ -0,0 +1,125 @@
+import asyncio
+import re
+import threading
+import asyncpg
+import pandas as pd
+from database.db_utils import get_database_url
+
+_loop = None
+_pool = None
+_lock = threading.Lock()
+
+
+def to_asyncpg_query(query):
+    """
+    Rewrites psycopg2-style %s placeholders into asyncpg's numbered $n form.
+
+    Parameters:
+        query (str): SQL query string using %s placeholders.
+
+    Returns:
+        str: The same query using $1, $2, ... placeholders.
+    """
+    counter = iter(range(1, query.count("%s") + 1))
+    return re.sub(r"%s", lambda _: f"${next(counter)}", query)
+
+
+async def create_pool():
+    """
+    Creates the asyncpg connection pool for the database.
+
+    At least one connection per dashboard query is kept open, so a whole batch of
+    them is sent at once without first connecting and the batch takes about one
+    round trip.
+
+    Returns:
+        asyncpg.Pool: A pool of 10 to 16 connections.
+    """
+    return await asyncpg.create_pool(get_database_url(), min_size=10, max_size=16)
+
+
+def get_pool():
+    """
+    Returns the asyncpg pool shared by every Streamlit session and rerun.
+
+    The pool is bound to the event loop that created it, so on first use a loop is
+    started on a daemon thread and the pool is created on it. Keeping the pool
+    alive lets its connections reuse their prepared statements across reruns.
+
+    Returns:
+        tuple: The event loop running the pool and the asyncpg.Pool itself.
+    """
+    global _loop, _pool
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+        if _pool is None:
+            _pool = asyncio.run_coroutine_threadsafe(create_pool(), _loop).result()
+        return _loop, _pool
+
+
+async def fetch_frame(pool, query, params=None, settings=None):
+    """
+    Runs a single query on a pooled connection and returns it as a DataFrame.
+
+    The query goes through the connection's statement cache, so repeated queries
+    skip parsing and planning. The statement is only prepared explicitly to read
+    the column names of an empty result. Session settings, if any, are applied
+    with SET LOCAL in a transaction around the query, so they do not leak to later
+    queries on the same connection; queries without settings skip the transaction.
+
+    Parameters:
+        pool (asyncpg.Pool): The connection pool to run the query on.
+        query (str): SQL query string using %s placeholders.
+        params (tuple): Optional tuple of parameters for the query.
+        settings (str): Optional SET LOCAL statements to run before the query.
+
+    Returns:
+        pandas.DataFrame: The query result, with columns even when it is empty.
+        numeric values are converted to floats, as pandas.read_sql does.
+    """
+    query = to_asyncpg_query(query)
+    async with pool.acquire() as connection:
+        if settings:
+            async with connection.transaction():
+                await connection.execute(settings)
+                records = await connection.fetch(query, *(params or ()))
+        else:
+            records = await connection.fetch(query, *(params or ()))
+        if records:
+            columns = list(records[0].keys())
+        else:
+            statement = await connection.prepare(query)
+            columns = [attribute.name for attribute in statement.get_attributes()]
+    return pd.DataFrame.from_records(
+        [tuple(record) for record in records], columns=columns, coerce_float=True
+    )
+
+
+def fetch_all(queries, settings=None):
+    """
+    Runs the given queries concurrently and returns their results in order.
+
+    The queries are gathered on the event loop of the shared pool; the calling
+    thread blocks until all of them have finished.
+
+    Parameters:
+        queries (list): List of (query, params) tuples.
+        settings (list): Optional SET LOCAL statements (or None) for each query.
+
+    Returns:
+        list: pandas DataFrames in the same order as the queries.
+    """
+    loop, pool = get_pool()
+    settings = settings or [None] * len(queries)
+
+    async def gather():
+        return await asyncio.gather(
+            *(
+                fetch_frame(pool, query, params, query_settings)
+                for (query, params), query_settings in zip(queries, settings)
+            )
+        )
+
+    return asyncio.run_coroutine_threadsafe(gather(), loop).result()
@@ -1,58 +1,350 @@
-from confluent_kafka import Producer, Consumer
-from config import KAFKA_BOOTSTRAP_SERVERS
+from datetime import datetime, timezone
+from time import sleep
+import orjson
+from confluent_kafka import TopicPartition
+from psycopg2 import InterfaceError, OperationalError
+from psycopg2.extras import execute_values
+from config import DB_NAME, EXACT_DISTINCT_COUNTS, KAFKA_TOPIC_NAME
+from database.db_utils import get_connection
+from database.db_queries import (
+    CREATE_DB_CHECK,
+    CREATE_DATABASE,
+    CREATE_VEHICLE_DATA_TABLE,
+    ADD_VEHICLE_DATA_TIME_COLUMNS,
+    CREATE_VEHICLE_DATA_INDEXES,
+    CREATE_TIMESCALEDB_EXTENSION,
+    CREATE_HLL_EXTENSION,
+    CREATE_VEHICLE_DATA_HYPERTABLE,
+    CREATE_ROUTE_HOURLY_VIEW,
+    ADD_ROUTE_HOURLY_POLICY,
+    ADD_VEHICLE_DATA_REORDER_POLICY,
+    INSERT_VEHICLE_DATA,
+    INSERT_VEHICLE_DATA_TEMPLATE,
+)
+from modules.kafka_utils import close_consumer, get_consumer
 
+VEHICLE_COLUMNS = (
+    "trip_id",
+    "route_id",
+    "latitude",
+    "longitude",
+    "bearing",
+    "speed",
+    "current_stop_sequence",
+    "current_status",
+    "timestamp",
+    "stop_id",
+    "vehicle_id",
+    "vehicle_label",
+    "license_plate",
+    "wheelchair_accessible",
+)
+VEHICLE_ID_INDEX = VEHICLE_COLUMNS.index("vehicle_id")
+TIMESTAMP_INDEX = VEHICLE_COLUMNS.index("timestamp")
+RETRY_DELAY = 5
+MAX_BATCH_ATTEMPTS = 3
+LEGACY_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# GTFS-RT WheelchairAccessible values sent by older producers.
+WHEELCHAIR_ACCESSIBILITY = {2: True, 3: False}
 
-def get_producer_config():
+
+def create_database():
+    """
+    Creates the application database if it does not exist yet.
+
+    The check and the CREATE DATABASE statement run against the default
+    "postgres" maintenance database.
+    """
+    connection = get_connection("postgres")
+    if connection is None:
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_DB_CHECK)
+            if cursor.fetchone() is None:
+                cursor.execute(CREATE_DATABASE)
+                print(f"Database {DB_NAME} created.")
+    finally:
+        connection.close()
+
+
+def create_table():
     """
-    Returns the configuration dictionary for a Kafka producer.
+    Creates the vehicle_data hypertable, its indexes and reorder policy, and the
+    route_hourly continuous aggregate with its refresh policy if they do not exist.
+    """
+    connection = get_connection()
+    if connection is None:
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_TIMESCALEDB_EXTENSION)
+            if not EXACT_DISTINCT_COUNTS:
+                cursor.execute(CREATE_HLL_EXTENSION)
+            cursor.execute(CREATE_VEHICLE_DATA_TABLE)
+            cursor.execute(ADD_VEHICLE_DATA_TIME_COLUMNS)
+            cursor.execute(CREATE_VEHICLE_DATA_HYPERTABLE)
+            cursor.execute(CREATE_VEHICLE_DATA_INDEXES)
+            cursor.execute(ADD_VEHICLE_DATA_REORDER_POLICY)
+            cursor.execute(CREATE_ROUTE_HOURLY_VIEW)
+            cursor.execute(ADD_ROUTE_HOURLY_POLICY)
+    finally:
+        connection.close()
 
-    The configuration includes the bootstrap servers and the number of retries
-    for sending messages.
+
+def insert_vehicle_data(connection, rows):
+    """
+    Upserts a batch of vehicle position records into the vehicle_data table.
+
+    All rows are sent with execute_values, so the batch costs a single round trip
+    per page instead of one per vehicle. Duplicate (vehicle_id, timestamp) pairs
+    are collapsed first, keeping the latest record, because a single upsert
+    statement cannot update the same row twice. Committing is left to the caller.
+
+    Parameters:
+        connection: An open psycopg2 connection.
+        rows (list): List of row tuples ordered like VEHICLE_COLUMNS.
+    """
+    unique_rows = {(row[VEHICLE_ID_INDEX], row[TIMESTAMP_INDEX]): row for row in rows}
+    if not unique_rows:
+        return
+
+    with connection.cursor() as cursor:
+        execute_values(
+            cursor,
+            INSERT_VEHICLE_DATA,
+            list(unique_rows.values()),
+            template=INSERT_VEHICLE_DATA_TEMPLATE,
+            page_size=500,
+        )
+
+
+def to_wheelchair_flag(value):
+    """
+    Converts a wheelchair accessibility value to the BOOLEAN column's type.
+
+    Older producers sent the raw GTFS-RT enum; NO_VALUE and UNKNOWN become None.
+
+    Parameters:
+        value: A bool, None or a WheelchairAccessible enum number.
 
     Returns:
-        dict: A dictionary containing the Kafka producer configuration.
+        bool: True, False or None.
     """
-    return {
-        "bootstrap.servers": KAFKA_BOOTSTRAP_SERVERS,
-        "retries": 5,
-    }
+    if value is None or isinstance(value, bool):
+        return value
+    return WHEELCHAIR_ACCESSIBILITY.get(value)
 
 
-def get_consumer_config():
+def decode_legacy_vehicle(vehicle):
     """
-    Generate the configuration dictionary for a Kafka consumer.
+    Converts a single-vehicle message, as sent by older producers, into a row.
+
+    Those messages carry the timestamp as a UTC "YYYY-MM-DD HH:MM:SS" string, which
+    is turned into epoch seconds for to_timestamp() in the insert.
+
+    Parameters:
+        vehicle (dict): The decoded message.
 
     Returns:
-        dict: A dictionary containing the configuration settings for a Kafka consumer,
-        including bootstrap servers, group ID, offset reset policy, and retry count.
+        tuple: Row tuple ordered like VEHICLE_COLUMNS.
+    """
+    timestamp = datetime.strptime(vehicle["timestamp"], LEGACY_TIMESTAMP_FORMAT)
+    vehicle = dict(
+        vehicle,
+        timestamp=int(timestamp.replace(tzinfo=timezone.utc).timestamp()),
+        wheelchair_accessible=to_wheelchair_flag(vehicle["wheelchair_accessible"]),
+    )
+    return tuple(vehicle[column] for column in VEHICLE_COLUMNS)
+
+
+def decode_vehicle_batch(value):
     """
-    return {
-        "bootstrap.servers": KAFKA_BOOTSTRAP_SERVERS,
-        "group.id": "vehicle-data-group",
-        "auto.offset.reset": "earliest",
-        "retries": 5,
-    }
+    Decodes a Kafka message holding a column-oriented batch of vehicles into rows.
+
+    Messages holding a single vehicle, as sent by older producers, are accepted too.
 
+    Parameters:
+        value (bytes): The raw message value.
+
+    Returns:
+        list: List of row tuples ordered like VEHICLE_COLUMNS.
 
-def create_kafka_producer():
+    Raises:
+        ValueError, KeyError, TypeError: If the message is not a valid vehicle batch.
     """
-    Creates and returns a Kafka producer instance.
+    batch = orjson.loads(value)
+    if not isinstance(batch["vehicle_id"], list):
+        return [decode_legacy_vehicle(batch)]
+    batch["wheelchair_accessible"] = [
+        to_wheelchair_flag(flag) for flag in batch["wheelchair_accessible"]
+    ]
+    return list(zip(*(batch[column] for column in VEHICLE_COLUMNS)))
 
-    The producer is configured using the settings provided by the
-    get_producer_config function.
+
+def open_connection():
+    """
+    Opens the consumer's database connection with autocommit disabled.
 
     Returns:
-        Producer: An instance of the Kafka producer.
+        connection: A psycopg2 connection, or None if connecting failed.
     """
-    return Producer(get_producer_config())
+    connection = get_connection()
+    if connection is not None:
+        connection.autocommit = False
+    return connection
 
 
-def create_kafka_consumer():
+def reset_connection(connection):
     """
-    Create a Kafka consumer instance using the predefined configuration.
+    Rolls back the failed transaction, or reopens the connection if it was lost.
+
+    Parameters:
+        connection: The consumer's psycopg2 connection, or None.
 
     Returns:
-        Consumer: An instance of the Kafka Consumer configured with settings
-        such as bootstrap servers, group ID, and offset reset policy.
+        connection: A usable psycopg2 connection, or None if reconnecting failed.
     """
-    return Consumer(get_consumer_config())
+    if connection is not None and not connection.closed:
+        try:
+            connection.rollback()
+            return connection
+        except (InterfaceError, OperationalError):
+            connection.close()
+    return open_connection()
+
+
+def insert_rows_individually(connection, rows):
+    """
+    Upserts rows one at a time, skipping the rows the database rejects.
+
+    Each row is committed on its own. Connection errors are raised instead of
+    skipping the row, since they say nothing about the row itself.
+
+    Parameters:
+        connection: An open psycopg2 connection with autocommit disabled.
+        rows (list): List of row tuples ordered like VEHICLE_COLUMNS.
+
+    Returns:
+        int: Number of rows that were skipped.
+    """
+    skipped = 0
+    for row in rows:
+        try:
+            insert_vehicle_data(connection, [row])
+            connection.commit()
+        except (InterfaceError, OperationalError):
+            raise
+        except Exception as e:
+            connection.rollback()
+            skipped += 1
+            print(
+                f"Skipping vehicle {row[VEHICLE_ID_INDEX]} "
+                f"at {row[TIMESTAMP_INDEX]}: {e}"
+            )
+    return skipped
+
+
+def rewind_consumer(consumer, msgs):
+    """
+    Seeks each partition back to the first offset of a batch so that it is
+    consumed again.
+
+    Parameters:
+        consumer (Consumer): The Kafka consumer the batch was read from.
+        msgs (list): The messages of the batch.
+    """
+    first_offsets = {}
+    for msg in msgs:
+        if msg.error():
+            continue
+        key = (msg.topic(), msg.partition())
+        first_offsets[key] = min(first_offsets.get(key, msg.offset()), msg.offset())
+    for (topic, partition), offset in first_offsets.items():
+        consumer.seek(TopicPartition(topic, partition, offset))
+
+
+def consume_kafka_messages(batch_size=500):
+    """
+    Consumes vehicle data messages from Kafka and stores them in PostgreSQL.
+
+    Messages are read in batches of up to batch_size; messages that cannot be
+    decoded are logged and skipped. Each batch is written in one database
+    transaction on a long-lived connection, and the Kafka offsets are committed
+    once after the transaction succeeds. The offset commit does not
+    wait for the broker; a batch redelivered after a failed commit is upserted
+    again without creating duplicates.
+
+    If a batch cannot be stored, the transaction is rolled back and the consumer
+    seeks back to the start of the batch, so it is retried after RETRY_DELAY
+    seconds instead of being skipped by the next offset commit. A lost database
+    connection is reopened before the retry. After MAX_BATCH_ATTEMPTS failures
+    the batch is stored row by row and the rows the database still rejects are
+    logged and skipped, so a single bad row cannot stall ingestion.
+
+    Parameters:
+        batch_size (int): Maximum number of messages consumed per batch.
+    """
+    consumer = get_consumer()
+    consumer.subscribe([KAFKA_TOPIC_NAME])
+    connection = open_connection()
+    if connection is None:
+        close_consumer()
+        return
+
+    failed_attempts = 0
+    try:
+        while True:
+            msgs = consumer.consume(num_messages=batch_size, timeout=1.0)
+            if not msgs:
+                continue
+
+            rows = []
+            for msg in msgs:
+                if msg.error():
+                    print(f"Consumer error: {msg.error()}")
+                    continue
+                try:
+                    rows.extend(decode_vehicle_batch(msg.value()))
+                except (KeyError, TypeError, ValueError) as e:
+                    print(f"Skipping undecodable message at offset {msg.offset()}: {e}")
+
+            try:
+                insert_vehicle_data(connection, rows)
+                connection.commit()
+            except Exception as e:
+                print(f"Error while inserting vehicle data: {e}")
+                connection = reset_connection(connection)
+                failed_attempts += 1
+                if failed_attempts < MAX_BATCH_ATTEMPTS or connection is None:
+                    rewind_consumer(consumer, msgs)
+                    sleep(RETRY_DELAY)
+                    continue
+                try:
+                    skipped = insert_rows_individually(connection, rows)
+                except (InterfaceError, OperationalError) as e:
+                    print(f"Lost the database connection, retrying the batch: {e}")
+                    connection = reset_connection(connection)
+                    rewind_consumer(consumer, msgs)
+                    sleep(RETRY_DELAY)
+                    continue
+                print(f"Stored the batch row by row, skipping {skipped} row(s).")
+
+            failed_attempts = 0
+            consumer.commit(asynchronous=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close_consumer()
+        if connection is not None:
+            connection.close()
+
+
+def main():
+    create_database()
+    create_table()
+    consume_kafka_messages()
+
+
+if __name__ == "__main__":
+    main()
@@ -26,13 +26,75 @@ CREATE TABLE IF NOT EXISTS vehicle_data (
 );
 """
 
+ADD_VEHICLE_DATA_TIME_COLUMNS = """
+ALTER TABLE vehicle_data
+    ADD COLUMN IF NOT EXISTS hour SMALLINT GENERATED ALWAYS AS (
+        EXTRACT(HOUR FROM (timestamp AT TIME ZONE 'Europe/Budapest'))::smallint
+    ) STORED,
+    ADD COLUMN IF NOT EXISTS dow SMALLINT GENERATED ALWAYS AS (
+        EXTRACT(DOW FROM (timestamp AT TIME ZONE 'Europe/Budapest'))::smallint
+    ) STORED;
+"""
+
+CREATE_VEHICLE_DATA_INDEXES = """
+CREATE INDEX IF NOT EXISTS vehicle_route_ts ON vehicle_data (route_id, timestamp DESC);
+CREATE INDEX IF NOT EXISTS vehicle_ts_brin ON vehicle_data
+    USING BRIN (timestamp) WITH (pages_per_range = 32);
+"""
+
+CREATE_TIMESCALEDB_EXTENSION = """
+CREATE EXTENSION IF NOT EXISTS timescaledb;
+"""
+
+CREATE_HLL_EXTENSION = """
+CREATE EXTENSION IF NOT EXISTS hll;
+"""
+
+CREATE_VEHICLE_DATA_HYPERTABLE = """
+SELECT create_hypertable(
+    'vehicle_data', 'timestamp', if_not_exists => TRUE, migrate_data => TRUE
+);
+"""
+
+CREATE_ROUTE_HOURLY_VIEW = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS route_hourly
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT route_id,
+       time_bucket(INTERVAL '1 hour', timestamp) AS bucket,
+       hour,
+       dow,
+       SUM(speed) AS speed_sum,
+       COUNT(speed) AS speed_count,
+       COUNT(*) AS traffic_count
+FROM vehicle_data
+GROUP BY route_id, bucket, hour, dow;
+"""
+
+ADD_ROUTE_HOURLY_POLICY = """
+SELECT add_continuous_aggregate_policy(
+    'route_hourly',
+    start_offset => INTERVAL '3 days',
+    end_offset => INTERVAL '1 hour',
+    schedule_interval => INTERVAL '15 minutes',
+    if_not_exists => TRUE
+);
+"""
+
+ADD_VEHICLE_DATA_REORDER_POLICY = """
+SELECT add_reorder_policy('vehicle_data', 'vehicle_route_ts', if_not_exists => TRUE);
+"""
+
+INSERT_VEHICLE_DATA_TEMPLATE = """
+(%s, %s, %s, %s, %s, %s, %s, %s, to_timestamp(%s), %s, %s, %s, %s, %s)
+"""
+
 INSERT_VEHICLE_DATA = """
 INSERT INTO vehicle_data (
     trip_id, route_id, latitude, longitude, bearing, speed,
     current_stop_sequence, current_status, timestamp, stop_id,
     vehicle_id, vehicle_label, license_plate, wheelchair_accessible
 )
-VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+VALUES %s
 ON CONFLICT (vehicle_id, timestamp) DO UPDATE
 SET latitude = EXCLUDED.latitude,
     longitude = EXCLUDED.longitude,
@@ -1,4 +1,6 @@
+from urllib.parse import quote_plus
 import psycopg2
+from sqlalchemy import create_engine
 from config import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
 
 
@@ -31,3 +33,43 @@ def get_connection(dbname=DB_NAME):
     except Exception as e:
         print(f"Error while connecting to the database {dbname}: {e}")
         return None
+
+
+def get_database_url(dbname=DB_NAME):
+    """
+    Builds the PostgreSQL connection URL from the configuration parameters.
+
+    Parameters:
+        dbname (str): The name of the database to connect to. Defaults to the value
+                    specified in the configuration file.
+
+    Returns:
+        str: A postgresql:// URL usable by SQLAlchemy and connectorx.
+    """
+    return (
+        f"postgresql://{quote_plus(DB_USER)}:{quote_plus(DB_PASSWORD)}"
+        f"@{DB_HOST}:{DB_PORT}/{dbname}"
+    )
+
+
+def connect_server(dbname=DB_NAME):
+    """
+    Creates a pooled SQLAlchemy engine for the PostgreSQL database.
+
+    The engine keeps up to ten connections open and checks them with a ping
+    before use, so callers that hold on to it avoid a new handshake per query.
+
+    Parameters:
+        dbname (str): The name of the database to connect to. Defaults to the value
+                    specified in the configuration file.
+
+    Returns:
+        Engine: A SQLAlchemy engine if it could be created, otherwise None.
+    """
+    try:
+        return create_engine(
+            get_database_url(dbname), pool_size=10, pool_pre_ping=True
+        )
+    except Exception as e:
+        print(f"Error while creating the database engine for {dbname}: {e}")
+        return None
@@ -0,0 +1,113 @@
+import functools
+import hashlib
+import os
+import threading
+import time
+
+import pandas as pd
+from config import CACHE_DIR, CACHE_TTL
+
+
+def get_cache_path(namespace, query, params=None, cache_dir=CACHE_DIR):
+    """
+    Builds the Parquet file path that caches the result of a query.
+
+    Args:
+        namespace (str): Name of the cached function, so that functions running
+            the same query with different post-processing do not share entries.
+        query (str): SQL query string.
+        params (tuple, optional): Parameters bound to the query.
+        cache_dir (str): Directory holding the cached result files.
+
+    Returns:
+        str: Path of the Parquet file keyed on the function, query and parameters.
+    """
+    key = hashlib.sha256(repr((namespace, query, params)).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{key}.parquet")
+
+
+def load_cached_result(
+    namespace, query, params=None, ttl=CACHE_TTL, cache_dir=CACHE_DIR
+):
+    """
+    Reads a cached query result if it exists and is younger than ``ttl`` seconds.
+
+    Args:
+        namespace (str): Name of the cached function.
+        query (str): SQL query string.
+        params (tuple, optional): Parameters bound to the query.
+        ttl (int): Number of seconds a cached result stays valid.
+        cache_dir (str): Directory holding the cached result files.
+
+    Returns:
+        pandas.DataFrame: The cached result, or None on a miss.
+    """
+    path = get_cache_path(namespace, query, params, cache_dir)
+    try:
+        if time.time() - os.path.getmtime(path) < ttl:
+            return pd.read_parquet(path, engine="pyarrow")
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def store_cached_result(namespace, query, params, df, cache_dir=CACHE_DIR):
+    """
+    Writes a query result to the cache as LZ4-compressed Parquet.
+
+    The file is written under a temporary name and moved into place, so readers
+    never see a partially written result.
+
+    Args:
+        namespace (str): Name of the cached function.
+        query (str): SQL query string.
+        params (tuple, optional): Parameters bound to the query.
+        df (pandas.DataFrame): The query result to cache.
+        cache_dir (str): Directory holding the cached result files.
+    """
+    path = get_cache_path(namespace, query, params, cache_dir)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        df.to_parquet(tmp_path, engine="pyarrow", compression="lz4", index=False)
+        os.replace(tmp_path, path)
+    except (OSError, ValueError) as e:
+        print(f"Error while caching query result to {path}: {e}")
+
+
+def parquet_cache(ttl=CACHE_TTL, cache_dir=CACHE_DIR):
+    """
+    Decorator caching DataFrame query results on disk as LZ4-compressed Parquet.
+
+    The wrapped function must take ``(query, params=None)`` and return a pandas
+    DataFrame or None. Results younger than ``ttl`` seconds are read back from
+    disk; None results are never cached. The cache namespace of the wrapped
+    function is exposed as ``cache_namespace`` so callers can fill the same
+    entries through load_cached_result and store_cached_result.
+
+    Args:
+        ttl (int): Number of seconds a cached result stays valid.
+        cache_dir (str): Directory holding the cached result files.
+
+    Returns:
+        callable: The decorator to apply to the query function.
+    """
+
+    def decorator(func):
+        namespace = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(query, params=None):
+            df = load_cached_result(namespace, query, params, ttl, cache_dir)
+            if df is not None:
+                return df
+
+            df = func(query, params)
+            if df is not None:
+                store_cached_result(namespace, query, params, df, cache_dir)
+            return df
+
+        wrapper.cache_namespace = namespace
+        return wrapper
+
+    return decorator
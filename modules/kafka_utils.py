@@ -1,36 +1,60 @@
+import threading
 from confluent_kafka import Producer, Consumer
 from config import KAFKA_BOOTSTRAP_SERVERS
 
+CONSUMER_GROUP_ID = "vehicle-data-group"
+
+_producer = None
+_consumers = {}
+_lock = threading.Lock()
+
 
 def get_producer_config():
     """
     Returns the configuration dictionary for a Kafka producer.
 
-    The configuration includes the bootstrap servers and the number of retries
-    for sending messages.
+    The configuration includes the bootstrap servers, the number of retries
+    for sending messages, and the batching and compression settings. Only the
+    partition leader acknowledges a write, which is enough for position data
+    that is replaced every few seconds.
 
     Returns:
         dict: A dictionary containing the Kafka producer configuration.
     """
     return {
         "bootstrap.servers": KAFKA_BOOTSTRAP_SERVERS,
+        "linger.ms": 100,
+        "batch.size": 64000,
+        "compression.type": "lz4",
+        "acks": "1",
+        "enable.idempotence": False,
+        "queue.buffering.max.messages": 200000,
         "retries": 5,
     }
 
 
-def get_consumer_config():
+def get_consumer_config(group_id=CONSUMER_GROUP_ID):
     """
     Generate the configuration dictionary for a Kafka consumer.
 
+    Args:
+        group_id (str): The consumer group to join.
+
     Returns:
         dict: A dictionary containing the configuration settings for a Kafka consumer,
-        including bootstrap servers, group ID, offset reset policy, and retry count.
+        including bootstrap servers, group ID, offset reset policy, and fetch sizes.
+        Offsets are not committed automatically; the caller commits them once a
+        batch has been stored.
     """
     return {
         "bootstrap.servers": KAFKA_BOOTSTRAP_SERVERS,
-        "group.id": "vehicle-data-group",
+        "group.id": group_id,
         "auto.offset.reset": "earliest",
-        "retries": 5,
+        "enable.auto.commit": False,
+        "fetch.min.bytes": 1_000_000,
+        "fetch.wait.max.ms": 500,
+        "fetch.message.max.bytes": 4_194_304,
+        "queued.min.messages": 100000,
     }
 
 
@@ -47,12 +71,82 @@ def create_kafka_producer():
     return Producer(get_producer_config())
 
 
-def create_kafka_consumer():
+def get_producer():
+    """
+    Returns the Kafka producer shared by the whole process.
+
+    The producer is created on first use, so its broker connections and metadata
+    are set up once and every caller feeds the same internal batching queue. A
+    daemon thread polls it for delivery reports, so callers can produce without
+    polling themselves.
+
+    Returns:
+        Producer: The shared Kafka producer instance.
+    """
+    global _producer
+    with _lock:
+        if _producer is None:
+            _producer = create_kafka_producer()
+            threading.Thread(target=poll_loop, args=(_producer,), daemon=True).start()
+        return _producer
+
+
+def poll_loop(producer):
+    """
+    Serves the delivery reports of a producer until the process exits.
+
+    Args:
+        producer (Producer): The producer to poll.
+    """
+    while True:
+        producer.poll(0.5)
+
+
+def flush_producer(timeout=10.0):
     """
-    Create a Kafka consumer instance using the predefined configuration.
+    Waits for the messages queued on the shared producer to be delivered.
+
+    Args:
+        timeout (float): Maximum number of seconds to wait.
 
     Returns:
-        Consumer: An instance of the Kafka Consumer configured with settings
-        such as bootstrap servers, group ID, and offset reset policy.
+        int: Number of messages still undelivered; 0 if no producer was created.
+    """
+    with _lock:
+        producer = _producer
+    if producer is None:
+        return 0
+    return producer.flush(timeout)
+
+
+def get_consumer(group_id=CONSUMER_GROUP_ID):
+    """
+    Returns the Kafka consumer shared by the whole process for a consumer group.
+
+    Args:
+        group_id (str): The consumer group to join.
+
+    Returns:
+        Consumer: The shared Kafka consumer instance for the group.
+    """
+    with _lock:
+        consumer = _consumers.get(group_id)
+        if consumer is None:
+            consumer = Consumer(get_consumer_config(group_id))
+            _consumers[group_id] = consumer
+        return consumer
+
+
+def close_consumer(group_id=CONSUMER_GROUP_ID):
+    """
+    Closes the shared Kafka consumer of a consumer group, if one was created.
+
+    A later get_consumer call for the group creates a new consumer.
+
+    Args:
+        group_id (str): The consumer group whose consumer to close.
     """
-    return Consumer(get_consumer_config())
+    with _lock:
+        consumer = _consumers.pop(group_id, None)
+    if consumer is not None:
+        consumer.close()
@@ -1,64 +1,86 @@
+from config import EXACT_DISTINCT_COUNTS
+
+if EXACT_DISTINCT_COUNTS:
+    DISTINCT_VEHICLE_COUNT = "COUNT(DISTINCT vehicle_id)"
+else:
+    DISTINCT_VEHICLE_COUNT = (
+        "hll_cardinality(hll_add_agg(hll_hash_text(vehicle_id)))::bigint"
+    )
+
 GET_DISTINCT_ROUTES = """
-SELECT DISTINCT route_id FROM vehicle_data
+SELECT DISTINCT route_id FROM route_hourly
 """
 
-TRAFFIC_HEATMAP_BASE = """
-SELECT latitude, longitude, COUNT(DISTINCT vehicle_id) AS traffic_count
+TRAFFIC_HEATMAP_BASE = f"""
+SELECT ROUND(latitude::numeric, 3)::float AS lat_bin,
+       ROUND(longitude::numeric, 3)::float AS lng_bin,
+       {DISTINCT_VEHICLE_COUNT} AS traffic_count
 FROM vehicle_data
 WHERE latitude IS NOT NULL AND longitude IS NOT NULL
 """
 
-KPIS_BASE = """
-SELECT route_id,
-       AVG(speed) AS avg_speed,
-       COUNT(DISTINCT vehicle_id) AS traffic_count
-FROM vehicle_data
-"""
-
-ROUTE_PERFORMANCE_BASE = """
+ROUTE_PERFORMANCE_BASE = f"""
 SELECT route_id,
        AVG(speed) AS avg_speed,
-       COUNT(DISTINCT vehicle_id) AS traffic_count
+       {DISTINCT_VEHICLE_COUNT} AS traffic_count
 FROM vehicle_data
 """
 
 PEAK_NONPEAK_BASE = """
-SELECT EXTRACT(HOUR FROM timestamp) AS hour,
-       AVG(speed) AS avg_speed,
-       COUNT(*) AS traffic_count
-FROM vehicle_data
+SELECT hour,
+       SUM(speed_sum) / NULLIF(SUM(speed_count), 0) AS avg_speed,
+       SUM(traffic_count) AS traffic_count
+FROM route_hourly
 """
 
 ENV_IMPACT_BASE = """
 SELECT route_id,
-       COUNT(vehicle_id) AS traffic_count,
-       AVG(speed) AS avg_speed
-FROM vehicle_data
+       SUM(traffic_count) * 1.0
+           / NULLIF(SUM(speed_sum) / NULLIF(SUM(speed_count), 0), 0)
+           AS estimated_emissions
+FROM route_hourly
 """
 
 CORRELATION_BASE = """
-SELECT speed, COUNT(*) AS traffic_count
-FROM vehicle_data
+SELECT CORR(speed, traffic_count) AS rho
+FROM (
+    SELECT speed, COUNT(*) AS traffic_count
+    FROM vehicle_data
 """
 
 ROUTE_OPTIMIZATION_BASE = """
-SELECT route_id, AVG(speed) AS avg_speed
-FROM vehicle_data
+SELECT route_id, avg_speed, suggested_speed
+FROM (
+    SELECT route_id,
+           avg_speed,
+           avg_speed + (10 - avg_speed) / 2 AS suggested_speed,
+           RANK() OVER (ORDER BY avg_speed DESC NULLS LAST) AS speed_rank
+    FROM (
+        SELECT route_id, SUM(speed_sum) / NULLIF(SUM(speed_count), 0) AS avg_speed
+        FROM route_hourly
 """
 
 TRAFFIC_BY_DAY_OF_WEEK_BASE = """
-SELECT EXTRACT(DOW FROM timestamp) AS day_of_week,
-       COUNT(*) AS traffic_count
-FROM vehicle_data
+SELECT CASE dow
+           WHEN 0 THEN 'Sunday'
+           WHEN 1 THEN 'Monday'
+           WHEN 2 THEN 'Tuesday'
+           WHEN 3 THEN 'Wednesday'
+           WHEN 4 THEN 'Thursday'
+           WHEN 5 THEN 'Friday'
+           WHEN 6 THEN 'Saturday'
+       END AS day_name,
+       SUM(traffic_count) AS traffic_count
+FROM route_hourly
 """
 
 SPEED_DISTRIBUTION_BASE = """
 SELECT route_id, speed
 FROM vehicle_data
-WHERE speed > 0
+WHERE speed > 0 AND route_id IS NOT NULL
 """
 
 VEHICLE_COUNT_BASE = """
-SELECT route_id, COUNT(*) AS vehicle_count
-FROM vehicle_data
+SELECT route_id, SUM(traffic_count) AS vehicle_count
+FROM route_hourly
 """
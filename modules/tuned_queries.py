@@ -0,0 +1,3 @@
+# Generated by scripts/tune_queries.py; rerun it to refresh these settings.
+
+TUNED_QUERY_SETTINGS = {}
@@ -0,0 +1,149 @@
+import os
+import pprint
+from itertools import product
+from analysis import SECTION_QUERIES, tuned_settings_key
+from database.db_utils import get_connection
+
+WORK_MEM_OPTIONS = ("4MB", "64MB", "256MB")
+HASHAGG_OPTIONS = ("on", "off")
+RUNS = 3
+MIN_SPEEDUP = 1.1
+BUSIEST_ROUTE_QUERY = """
+SELECT route_id FROM route_hourly
+GROUP BY route_id ORDER BY SUM(traffic_count) DESC LIMIT 1;
+"""
+TUNED_QUERIES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "modules",
+    "tuned_queries.py",
+)
+
+
+def candidate_settings():
+    """
+    Lists the session settings to try for each query.
+
+    Returns:
+        list: SET LOCAL statement strings, starting with "" for the defaults.
+    """
+    return [""] + [
+        f"SET LOCAL work_mem = '{work_mem}'; SET LOCAL enable_hashagg = {hashagg};"
+        for work_mem, hashagg in product(WORK_MEM_OPTIONS, HASHAGG_OPTIONS)
+    ]
+
+
+def execution_time(connection, query, params, settings):
+    """
+    Measures the execution time of a query under the given session settings.
+
+    The query is run RUNS times with EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) in a
+    transaction that is rolled back, and the fastest run is kept.
+
+    Parameters:
+        connection: psycopg2 connection with autocommit disabled.
+        query (str): SQL query string using %s placeholders.
+        params (tuple): Optional tuple of parameters for the query.
+        settings (str): SET LOCAL statements to run before the query.
+
+    Returns:
+        float: The fastest execution time in milliseconds.
+    """
+    explain = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query.strip().rstrip(";")
+    timings = []
+    with connection.cursor() as cursor:
+        for _ in range(RUNS):
+            if settings:
+                cursor.execute(settings)
+            cursor.execute(explain, params)
+            plan = cursor.fetchone()[0][0]
+            timings.append(plan["Execution Time"])
+            connection.rollback()
+    return min(timings)
+
+
+def tune_query(connection, query, params):
+    """
+    Picks the fastest session settings for a query.
+
+    Settings are only chosen when they beat the defaults by at least MIN_SPEEDUP,
+    so measurement noise does not pin arbitrary values.
+
+    Parameters:
+        connection: psycopg2 connection with autocommit disabled.
+        query (str): SQL query string using %s placeholders.
+        params (tuple): Optional tuple of parameters for the query.
+
+    Returns:
+        str: The chosen SET LOCAL statements, or None to keep the defaults.
+    """
+    timings = {
+        settings: execution_time(connection, query, params, settings)
+        for settings in candidate_settings()
+    }
+    best = min(timings, key=timings.get)
+    if not best or timings[""] < timings[best] * MIN_SPEEDUP:
+        return None
+    return best
+
+
+def busiest_route(connection):
+    """
+    Picks the route used to tune the route-filtered query variants.
+
+    Parameters:
+        connection: psycopg2 connection with autocommit disabled.
+
+    Returns:
+        str: The route_id with the most traffic, or None if there is no data.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(BUSIEST_ROUTE_QUERY)
+        row = cursor.fetchone()
+    connection.rollback()
+    return row[0] if row else None
+
+
+def write_tuned_queries(tuned, path=TUNED_QUERIES_PATH):
+    """
+    Writes the chosen settings to modules/tuned_queries.py.
+
+    Parameters:
+        tuned (dict): Mapping of tuned_settings_key to its SET LOCAL statements.
+        path (str): File to write.
+    """
+    with open(path, "w") as f:
+        f.write(
+            "# Generated by scripts/tune_queries.py; "
+            "rerun it to refresh these settings.\n\n"
+        )
+        f.write(f"TUNED_QUERY_SETTINGS = {pprint.pformat(tuned)}\n")
+
+
+def main():
+    connection = get_connection()
+    if connection is None:
+        return
+    connection.autocommit = False
+
+    tuned = {}
+    try:
+        routes = ["All"]
+        route = busiest_route(connection)
+        if route is not None:
+            routes.append(route)
+        for name, build_query in SECTION_QUERIES.items():
+            for selected_route in routes:
+                query, params = build_query(selected_route)
+                key = tuned_settings_key(name, params)
+                settings = tune_query(connection, query, params)
+                print(f"{key}: {settings or 'defaults'}")
+                if settings:
+                    tuned[key] = settings
+    finally:
+        connection.close()
+
+    write_tuned_queries(tuned)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from analysis import (
     display_kpis,
     analyze_route_performance,
@@ -11,57 +13,105 @@ from analysis import (
     analyze_speed_distribution_by_route,
     analyze_vehicle_count_per_route,
     display_traffic_density_heatmap,
-    fetch_data,
+    fetch_speed_histogram,
+    fetch_table,
+    prefetch_data,
+    speed_distribution_query,
+    SECTION_QUERIES,
 )
 from modules.queries import GET_DISTINCT_ROUTES
 
 
-def main():
-    st.title("BKK Traffic Data Dashboard")
-    st.write(
-        "This dashboard provides real-time insights into traffic data collected from BKK."
-    )
+@st.cache_data(ttl=60, show_spinner=False)
+def load_routes():
+    """
+    Returns the distinct route IDs, memoized in-process for a minute so widget
+    interactions do not re-query them on every rerun.
 
-    route_df = fetch_data(GET_DISTINCT_ROUTES)
-    if route_df is None or route_df.empty:
-        st.write("No routes available.")
-        return
+    The route IDs are read straight from the Arrow result without building a
+    DataFrame.
+
+    :return: List of route_id values.
+    """
+    return fetch_table(GET_DISTINCT_ROUTES).column("route_id").to_pylist()
 
-    route_ids = route_df["route_id"].tolist()
-    selected_route = st.selectbox("Select a bus route", ["All"] + route_ids)
 
-    display_kpis(selected_route)
+@st.fragment
+def analytics(route_ids):
+    """
+    Renders the route picker and every analysis section for the selected route.
+
+    Runs as a fragment, so picking another route reruns only this function rather
+    than the whole script.
+
+    :param route_ids: List of route_id values to offer in the route picker.
+    """
+    selected_route = st.selectbox("Select a bus route", ["All"] + route_ids)
 
-    display_map(selected_route)
+    # The speed distribution streams its rows through a server-side cursor, so it
+    # runs on a worker thread while the other sections are fetched in one batch.
+    # The worker gets this run's ScriptRunContext for the cached engine lookup.
+    with ThreadPoolExecutor(
+        max_workers=1,
+        initializer=add_script_run_ctx,
+        initargs=(None, get_script_run_ctx()),
+    ) as executor:
+        speed_future = executor.submit(
+            fetch_speed_histogram, *speed_distribution_query(selected_route)
+        )
+        results = prefetch_data(
+            {
+                name: build_query(selected_route)
+                for name, build_query in SECTION_QUERIES.items()
+            }
+        )
+
+    display_kpis(selected_route, results["route_performance"])
+
+    display_map(selected_route, results["map"])
 
     st.subheader("Traffic Analysis")
 
     st.write("### Traffic Density Heatmap")
-    display_traffic_density_heatmap(selected_route)
+    display_traffic_density_heatmap(selected_route, results["heatmap"])
 
     st.write("### Route Performance Analysis")
-    analyze_route_performance(selected_route)
+    analyze_route_performance(selected_route, results["route_performance"])
 
     st.write("### Peak vs. Non-Peak Hour Analysis")
-    analyze_peak_vs_nonpeak(selected_route)
+    analyze_peak_vs_nonpeak(selected_route, results["peak_vs_nonpeak"])
 
     st.write("### Environmental Impact Analysis")
-    analyze_environmental_impact(selected_route)
+    analyze_environmental_impact(selected_route, results["environmental_impact"])
 
     st.write("### Correlation Analysis")
-    analyze_correlation(selected_route)
+    analyze_correlation(selected_route, results["correlation"])
 
     st.write("### Route Optimization Suggestions")
-    analyze_route_optimization(selected_route)
+    analyze_route_optimization(selected_route, results["route_optimization"])
 
     st.write("### Traffic Volume by Day of Week")
-    analyze_traffic_by_day_of_week(selected_route)
+    analyze_traffic_by_day_of_week(selected_route, results["traffic_by_day_of_week"])
 
     st.write("### Speed Distribution by Route")
-    analyze_speed_distribution_by_route(selected_route)
+    analyze_speed_distribution_by_route(selected_route, speed_future.result())
 
     st.write("### Vehicle Count per Route")
-    analyze_vehicle_count_per_route(selected_route)
+    analyze_vehicle_count_per_route(selected_route, results["vehicle_count"])
+
+
+def main():
+    st.title("BKK Traffic Data Dashboard")
+    st.write(
+        "This dashboard provides real-time insights into traffic data collected from BKK."
+    )
+
+    route_ids = load_routes()
+    if not route_ids:
+        st.write("No routes available.")
+        return
+
+    analytics(route_ids)
 
 
 if __name__ == "__main__":